@@ -0,0 +1,366 @@
+import pandas as pd
+import numpy as np
+
+# =========================================================
+# CÁLCULOS DE REFERENCIA DEL DASHBOARD FPD
+# Funciones puras de pandas (sin Streamlit). dashboard.py las usa para
+# pintar cada sección y verificar_equivalencia.py las toma como la
+# implementación de referencia contra la que se comparan otros motores.
+# =========================================================
+
+# Configuraciones
+MESES_A_EXCLUIR = 2
+VENTANA_MESES = 24
+MIN_CREDITOS_RANKING = 5
+TAMANO_MUESTRA = 20000  # créditos de la muestra estratificada (vista previa)
+
+# Rangos de monto (Sensibilidad por Monto y Drill-through)
+BINS_MONTO = [0, 3000, 5000, 8000, 12000, 20000, 1000000]
+LABELS_MONTO = ['0-3k', '3k-5k', '5k-8k', '8k-12k', '12k-20k', '>20k']
+
+# Columnas del listado de créditos (Exportar y Drill-through)
+COLUMNAS_EXPORT = [
+    'id_credito', 'id_segmento', 'id_producto',
+    'producto_agrupado', 'origen2', 'cosecha',
+    'monto_otorgado', 'cuota', 'sucursal'
+]
+
+# Dimensiones disponibles para el drill-through (cosecha × dimensión)
+DIMENSIONES_DRILL = {
+    'unidad': 'Unidad Regional',
+    'sucursal': 'Sucursal',
+    'producto': 'Producto',
+    'tipo_cliente': 'Tipo de Cliente',
+    'rango_monto': 'Rango de Monto'
+}
+
+
+# --- 1. PREPARACIÓN DE DATOS ---
+def preparar_datos(df):
+    # Normaliza el archivo crudo (xlsx/csv) a las columnas que usa el dashboard.
+    # Lanza ValueError si faltan las columnas clave.
+    df = df.rename(columns=lambda c: str(c).lower().strip())  # copia: no modifica el DataFrame del llamador
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    col_cosecha = next((c for c in df.columns if 'cosecha' in c), None)
+    col_fpd2 = next((c for c in df.columns if 'fpd2' in c), None)
+    if not col_fpd2: col_fpd2 = next((c for c in df.columns if 'fpd' in c), None)
+    col_np = next((c for c in df.columns if 'np' == c or 'np' in c.split('_')), None)
+    col_monto = next((c for c in df.columns if 'monto' in c and 'otorgado' in c), None)
+    if not col_monto: col_monto = next((c for c in df.columns if 'monto' in c), None)
+
+    if not col_cosecha or not col_fpd2:
+        raise ValueError(f"Faltan columnas clave. Encontré: {list(df.columns)}")
+
+    df_clean = df.copy()
+
+    # Procesamiento Fechas
+    df_clean['cosecha_str'] = df_clean[col_cosecha].astype(str).str.replace(r'\.0$', '', regex=True)
+    try:
+        df_clean['fecha_dt'] = pd.to_datetime(df_clean['cosecha_str'], format='%Y%m', errors='coerce')
+    except:
+        df_clean['fecha_dt'] = pd.to_datetime(df_clean['cosecha_str'], errors='coerce')
+
+    df_clean['anio'] = df_clean['fecha_dt'].dt.year.fillna(0).astype(int).astype(str)
+    df_clean['mes_num'] = df_clean['fecha_dt'].dt.month.fillna(0).astype(int)
+
+    mapa_meses = {1:'Ene', 2:'Feb', 3:'Mar', 4:'Abr', 5:'May', 6:'Jun', 7:'Jul', 8:'Ago', 9:'Sep', 10:'Oct', 11:'Nov', 12:'Dic', 0:'SinDato'}
+    df_clean['mes_nombre'] = df_clean['mes_num'].map(mapa_meses)
+
+    df_clean['is_fpd2'] = df_clean[col_fpd2].astype(str).apply(lambda x: 1 if 'FPD' in x.upper() else 0)
+    df_clean['is_np'] = df_clean[col_np].astype(str).apply(lambda x: 1 if 'NP' in x.upper() else 0) if col_np else 0
+
+    if col_monto: df_clean['monto'] = pd.to_numeric(df_clean[col_monto], errors='coerce').fillna(0)
+    else: df_clean['monto'] = 0
+
+    def find_best_column(dataframe, candidates_priority, fallback_search_term):
+        for cand in candidates_priority:
+            if cand in dataframe.columns: return cand
+        possible = [c for c in dataframe.columns if fallback_search_term in c and 'id' not in c]
+        if possible: return possible[0]
+        return None
+
+    c_suc = find_best_column(df_clean, ['sucursal', 'nombre_sucursal'], 'sucursal')
+    df_clean['sucursal'] = df_clean[c_suc].fillna('Sin Dato').astype(str) if c_suc else 'Sin Dato'
+
+    c_uni = find_best_column(df_clean, ['unidad_regional', 'regional', 'region', 'unidad'], 'regional')
+    if not c_uni: c_uni = find_best_column(df_clean, [], 'unidad')
+    df_clean['unidad'] = df_clean[c_uni].fillna('Sin Dato').astype(str) if c_uni else 'Sin Dato'
+
+    c_prod = find_best_column(df_clean, ['producto_agrupado', 'nombre_producto', 'producto'], 'producto')
+    df_clean['producto'] = df_clean[c_prod].fillna('Sin Dato').astype(str) if c_prod else 'Sin Dato'
+
+    c_ori = find_best_column(df_clean, ['origen2', 'origen'], 'origen')
+    df_clean['origen'] = df_clean[c_ori].fillna('Sin Dato').astype(str).str.title() if c_ori else 'Sin Dato'
+
+    c_tip = find_best_column(df_clean, ['tipo_cliente', 'tipo'], 'cliente')
+    df_clean['tipo_cliente'] = df_clean[c_tip].fillna('Sin Dato').astype(str) if c_tip else 'Sin Dato'
+
+    df_clean['cosecha_x'] = df_clean['cosecha_str']
+    df_clean['rango_monto'] = pd.cut(df_clean['monto'], bins=BINS_MONTO, labels=LABELS_MONTO)
+
+    return df_clean
+
+
+def ventana_cosechas(df):
+    # Ventana de tiempo fija: (todas, maduras, visualizar, mes_actual, mes_anterior)
+    todas = sorted(df['cosecha_x'].unique())
+    maduras = todas[:-MESES_A_EXCLUIR] if len(todas) > MESES_A_EXCLUIR else todas
+    visualizar = maduras[-VENTANA_MESES:] if len(maduras) > VENTANA_MESES else maduras
+
+    # Definición de la última cosecha madura
+    mes_actual = maduras[-1] if len(maduras) >= 1 else None
+    mes_anterior = maduras[-2] if len(maduras) >= 2 else None
+    return todas, maduras, visualizar, mes_actual, mes_anterior
+
+
+def filtrar_base(df, sel_uni=None, sel_suc=None, sel_pro=None, sel_tip=None):
+    # Base filtrada por los filtros de negocio de la barra lateral (Pestaña 1)
+    df_base = df.copy()
+
+    if sel_uni: df_base = df_base[df_base['unidad'].isin(sel_uni)]
+    if sel_suc: df_base = df_base[df_base['sucursal'].isin(sel_suc)]
+    if sel_pro: df_base = df_base[df_base['producto'].isin(sel_pro)]
+    if sel_tip: df_base = df_base[df_base['tipo_cliente'].isin(sel_tip)]
+    return df_base
+
+
+def excluir_sucursales_especiales(df_in):
+    # Excluye sucursales '999' y 'nomina colaboradores' (rankings, comparativa y Pareto)
+    mask_999 = df_in['sucursal'].astype(str).str.contains("999", na=False)
+    mask_nomina = df_in['sucursal'].astype(str).str.lower().str.contains("nomina colaboradores", na=False)
+    return df_in[~(mask_999 | mask_nomina)]
+
+
+def excluir_pr_nominas(df_in):
+    # Excluye la unidad 'pr nominas' (análisis regional y mapa de calor)
+    return df_in[~df_in['unidad'].astype(str).str.lower().str.contains("pr nominas", case=False)]
+
+
+# --- 2. PESTAÑA 1: MONITOR FPD ---
+def ranking_sucursales(df_base, mes_actual):
+    # Ranking de la última cosecha madura: (df_ranking_calc, r_clean_calc, worst_10_sucursales)
+    worst_10_sucursales = []
+    df_ranking_calc = pd.DataFrame()
+    r_clean_calc = pd.DataFrame()
+
+    if mes_actual and not df_base.empty:
+        df_ranking_base = df_base[df_base['cosecha_x'] == mes_actual].copy()
+    else:
+        df_ranking_base = pd.DataFrame()
+
+    if not df_ranking_base.empty:
+        # 1. Base para el Ranking (Excluir '999' y 'nomina')
+        df_ranking_calc = excluir_sucursales_especiales(df_ranking_base)
+
+        # 2. Agregar 'sum' para contar los casos FPD
+        r_calc = df_ranking_calc.groupby('sucursal')['is_fpd2'].agg(['count', 'sum', 'mean']).reset_index()
+
+        r_clean_calc = r_calc[r_calc['count'] >= MIN_CREDITOS_RANKING].copy()
+
+        # 3. Obtener el Bottom 10 (peores tasas)
+        if not r_clean_calc.empty:
+            bottom_10_df = r_clean_calc.sort_values('mean', ascending=False).head(10)
+            worst_10_sucursales = bottom_10_df['sucursal'].tolist()
+
+    return df_ranking_calc, r_clean_calc, worst_10_sucursales
+
+
+def tendencia_global(df_top):
+    d = df_top.groupby('cosecha_x')['is_fpd2'].mean().reset_index()
+    d['FPD2 %'] = d['is_fpd2']*100
+    return d
+
+
+def fisico_vs_digital(df_top):
+    mask = df_top['origen'].str.contains('Fisico|Digital', case=False, na=False)
+    d_comp = df_top[mask].copy()
+    if d_comp.empty:
+        return pd.DataFrame()
+    d = d_comp.groupby(['cosecha_x', 'origen'])['is_fpd2'].mean().reset_index()
+    d['FPD2 %'] = d['is_fpd2']*100
+    return d
+
+
+def comparativo_anual(df_base):
+    todas_neg = sorted(df_base['cosecha_x'].unique())
+    cosechas_maduras_globales = todas_neg[:-MESES_A_EXCLUIR] if len(todas_neg) > MESES_A_EXCLUIR else todas_neg
+
+    df_yoy = df_base[
+        (df_base['cosecha_x'].isin(cosechas_maduras_globales)) &
+        (df_base['anio'].isin(['2023', '2024', '2025']))
+    ].copy()
+    if df_yoy.empty:
+        return pd.DataFrame()
+
+    dy = df_yoy.groupby(['mes_num', 'mes_nombre', 'anio'])['is_fpd2'].mean().reset_index()
+    dy['FPD2 %'] = dy['is_fpd2'] * 100
+    return dy.sort_values('mes_num')
+
+
+def historico_indicadores(df_base, visualizar):
+    df_ind = df_base[df_base['cosecha_x'].isin(visualizar)].copy()
+    if df_ind.empty:
+        return pd.DataFrame()
+    dh = df_ind.groupby('cosecha_x')[['is_fpd2', 'is_np']].mean().reset_index()
+    dh['% FPD'] = dh['is_fpd2'] * 100
+    dh['% NP'] = dh['is_np'] * 100
+    return dh
+
+
+def evolucion_tipo_cliente(df_base, visualizar):
+    # Excluye tipo de cliente 'former'
+    df_tipo = df_base[df_base['cosecha_x'].isin(visualizar)].copy()
+    df_tipo = df_tipo[~df_tipo['tipo_cliente'].astype(str).str.lower().str.contains('former')]
+    if df_tipo.empty:
+        return pd.DataFrame()
+    dt = df_tipo.groupby(['cosecha_x', 'tipo_cliente'])['is_fpd2'].mean().reset_index()
+    dt['FPD2 %'] = dt['is_fpd2'] * 100
+    return dt
+
+
+# --- 3. PESTAÑA 2: RESUMEN EJECUTIVO ---
+def resumen_regional(df, mes_actual):
+    df_resumen = excluir_pr_nominas(df[df['cosecha_x'] == mes_actual])
+    return df_resumen.groupby('unidad')['is_fpd2'].mean().reset_index()
+
+
+def resumen_productos(df, mes_actual):
+    # (resumen_prod con MIN_CREDITOS_RANKING aplicado, promedio_global de la cosecha)
+    df_resumen = df[df['cosecha_x'] == mes_actual]
+    resumen_prod = df_resumen.groupby('producto').agg(
+        tasa=('is_fpd2', 'mean'),
+        conteo_total=('is_fpd2', 'count'),
+        conteo_fpd=('is_fpd2', 'sum')
+    ).reset_index()
+
+    resumen_prod = resumen_prod[resumen_prod['conteo_total'] >= MIN_CREDITOS_RANKING]
+    promedio_global = df_resumen['is_fpd2'].mean()
+    return resumen_prod, promedio_global
+
+
+def comparativa_sucursales(df, mes_anterior, mes_actual):
+    # Tasas por sucursal (mes_anterior, mes_actual) de las sucursales válidas para comparar
+    df_comp = excluir_sucursales_especiales(df[df['cosecha_x'].isin([mes_anterior, mes_actual])].copy())
+
+    pivot = df_comp.groupby(['sucursal', 'cosecha_x']).agg(tasa=('is_fpd2', 'mean'), conteo=('is_fpd2', 'count')).reset_index()
+
+    pivot_tasa = pivot.pivot(index='sucursal', columns='cosecha_x', values='tasa')
+    pivot_count = pivot.pivot(index='sucursal', columns='cosecha_x', values='conteo')
+
+    if mes_actual in pivot_tasa.columns and mes_anterior in pivot_tasa.columns:
+        validas = pivot_count[(pivot_count[mes_actual] >= MIN_CREDITOS_RANKING) & (pivot_count[mes_anterior] > 0)].index
+        return pivot_tasa.loc[validas]
+    return pd.DataFrame()
+
+
+def detalle_bottom10(df_base, mes_actual, worst_10_sucursales):
+    # Casos FPD / Total / Tasa por sucursal y producto para el Bottom 10 (valores numéricos)
+    df_detalle = df_base[df_base['cosecha_x'] == mes_actual].copy()
+    df_detalle = df_detalle[df_detalle['sucursal'].isin(worst_10_sucursales)]
+    df_detalle = df_detalle[~df_detalle['sucursal'].astype(str).str.contains("999", na=False)]
+    if df_detalle.empty:
+        return pd.DataFrame()
+
+    return df_detalle.groupby(['sucursal', 'producto']).agg(
+        FPD_Casos=('is_fpd2', 'sum'),
+        Total_Casos=('is_fpd2', 'count'),
+        FPD_Tasa=('is_fpd2', 'mean')
+    ).reset_index()
+
+
+# --- 4. PESTAÑA 3: INSIGHTS ESTRATÉGICOS ---
+def heatmap_regional(df, ultimos_6):
+    df_heat = excluir_pr_nominas(df[df['cosecha_x'].isin(ultimos_6)].copy())
+
+    pivot_heat = df_heat.groupby(['unidad', 'cosecha_x'])['is_fpd2'].mean().reset_index()
+    pivot_heat['FPD2 %'] = pivot_heat['is_fpd2'] * 100
+
+    return pivot_heat.pivot(index='unidad', columns='cosecha_x', values='FPD2 %')
+
+
+def pareto_sucursales(df, ultima):
+    # (pareto, num_sucursales_80, total_sucursales, pct_sucursales)
+    df_pareto = excluir_sucursales_especiales(df[df['cosecha_x'] == ultima].copy())
+
+    pareto = df_pareto.groupby('sucursal')['is_fpd2'].sum().reset_index()
+    pareto = pareto.sort_values('is_fpd2', ascending=False)
+    pareto = pareto[pareto['is_fpd2'] > 0].copy()
+
+    pareto['Acumulado'] = pareto['is_fpd2'].cumsum()
+    pareto['% Acumulado'] = pareto['is_fpd2'].cumsum() / pareto['is_fpd2'].sum() * 100
+    pareto['Rank'] = range(1, len(pareto) + 1)
+
+    corte_80 = pareto[pareto['% Acumulado'] <= 80]
+    num_sucursales_80 = len(corte_80)
+    total_sucursales = len(pareto)
+    pct_sucursales = (num_sucursales_80 / total_sucursales * 100) if total_sucursales > 0 else 0
+    return pareto, num_sucursales_80, total_sucursales, pct_sucursales
+
+
+def sensibilidad_monto(df, ultima):
+    # 'rango_monto' se calcula en preparar_datos() con BINS_MONTO / LABELS_MONTO
+    df_monto = df[df['cosecha_x'] == ultima].copy()
+    resumen_monto = df_monto.groupby('rango_monto', observed=False)['is_fpd2'].agg(['mean', 'count']).reset_index()
+    resumen_monto['FPD2 %'] = resumen_monto['mean'] * 100
+    return resumen_monto
+
+
+# --- 5. PESTAÑA 4: EXPORTAR ---
+def casos_exportar(df, cosecha_objetivo):
+    # Créditos en FPD2 de la cosecha objetivo (sin filtros de la barra lateral)
+    df_export = df[
+        (df['cosecha_x'] == cosecha_objetivo) &
+        (df['is_fpd2'] == 1)
+    ].copy()
+
+    # Validamos que las columnas existan antes de filtrar para evitar errores
+    cols_finales = [c for c in COLUMNAS_EXPORT if c in df_export.columns]
+    return df_export[cols_finales]
+
+
+# --- 6. ÍNDICE DE DRILL-THROUGH ---
+def build_drill_index(df):
+    # Posiciones de fila (int32, ordenadas) por cosecha y por celda cosecha × dimensión.
+    indice = {'cosecha_x': {k: v.astype('int32') for k, v in df.groupby('cosecha_x').indices.items()}}
+    for dim in DIMENSIONES_DRILL:
+        grupos = df.groupby(['cosecha_x', dim], observed=True).indices
+        indice[dim] = {k: v.astype('int32') for k, v in grupos.items()}
+    return indice
+
+
+def get_drill_rows(indice, cosecha, filtros=None):
+    # Intersecta las posiciones de cada dimensión; un filtro puede ser un valor o una lista (unión).
+    vacio = np.empty(0, dtype='int32')
+    posiciones = indice['cosecha_x'].get(cosecha, vacio)
+    for dim, valores in (filtros or {}).items():
+        if valores is None or (isinstance(valores, list) and not valores): continue
+        if not isinstance(valores, list): valores = [valores]
+        partes = [indice[dim].get((cosecha, v), vacio) for v in valores]
+        posiciones = np.intersect1d(posiciones, np.unique(np.concatenate(partes)), assume_unique=True)
+    return posiciones
+
+
+# --- 7. VISTA PREVIA (MUESTRA ESTRATIFICADA) ---
+def muestra_estratificada(df, tamano=TAMANO_MUESTRA, semilla=0):
+    # Asignación proporcional por estrato cosecha × unidad con redondeo aleatorio del cupo
+    # (piso de N_h·f más un uniforme por estrato): cada crédito entra con probabilidad f,
+    # así que la muestra es autoponderada y las tasas no necesitan pesos N_h/n_h.
+    # Los estratos muy pequeños pueden quedar sin créditos en la vista previa.
+    if len(df) <= tamano:
+        return df
+    fraccion = tamano / len(df)
+    estrato = df.groupby(['cosecha_x', 'unidad']).ngroup()
+    tam_estrato = estrato.map(estrato.value_counts())
+
+    rng = np.random.default_rng(semilla)
+    cupo = np.floor(tam_estrato * fraccion + rng.random(estrato.max() + 1)[estrato.values])
+    orden = pd.Series(rng.random(len(df)), index=df.index).groupby(estrato).rank(method='first')
+    return df[orden <= cupo]
+
+
+def margen_error(p, n, N, z=1.96):
+    # Margen de error (95%) de una proporción estimada con n de N créditos
+    if n <= 0 or N <= 1:
+        return float('nan')
+    return z * np.sqrt(p * (1 - p) / n * (N - n) / (N - 1))
@@ -3,18 +3,26 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import os
+from calculos_fpd import (
+    LABELS_MONTO, COLUMNAS_EXPORT, DIMENSIONES_DRILL,
+    preparar_datos, ventana_cosechas, filtrar_base, ranking_sucursales,
+    tendencia_global, fisico_vs_digital, comparativo_anual, historico_indicadores, evolucion_tipo_cliente,
+    resumen_regional, resumen_productos, comparativa_sucursales, detalle_bottom10,
+    heatmap_regional, pareto_sucursales, sensibilidad_monto, casos_exportar,
+    build_drill_index, get_drill_rows, muestra_estratificada, margen_error
+)
 
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Dashboard FPD2 Pro", layout="wide")
 st.title("📊 Monitor FPD")
 
-# Configuraciones
-MESES_A_EXCLUIR = 2    
-VENTANA_MESES = 24     
-MIN_CREDITOS_RANKING = 5 
+# Configuraciones (MESES_A_EXCLUIR, VENTANA_MESES, MIN_CREDITOS_RANKING y rangos de monto en calculos_fpd.py)
+FILAS_POR_PAGINA = 50
 
 # --- 2. FUNCIÓN DE CARGA ---
-@st.cache_data 
+# cache_resource: la base, el índice y la muestra se comparten sin copiarse en cada rerun
+# (cache_data los deserializa completos cada vez). Son de solo lectura: no modificarlos in-place.
+@st.cache_resource
 def load_data():
     
     archivo = 'fpd gemini.xlsx'
@@ -33,100 +41,142 @@ def load_data():
         st.error(f"Error leyendo el archivo {archivo}: {e}")
         st.stop()
 
-    df.columns = [str(c).lower().strip() for c in df.columns]
-    df = df.loc[:, ~df.columns.duplicated()]
-
-    col_cosecha = next((c for c in df.columns if 'cosecha' in c), None)
-    col_fpd2 = next((c for c in df.columns if 'fpd2' in c), None)
-    if not col_fpd2: col_fpd2 = next((c for c in df.columns if 'fpd' in c), None)
-    col_np = next((c for c in df.columns if 'np' == c or 'np' in c.split('_')), None) 
-    col_monto = next((c for c in df.columns if 'monto' in c and 'otorgado' in c), None)
-    if not col_monto: col_monto = next((c for c in df.columns if 'monto' in c), None)
-
-    if not col_cosecha or not col_fpd2:
-        st.error(f"Faltan columnas clave. Encontré: {list(df.columns)}")
-        st.stop()
-
-    df_clean = df.copy()
-    
-    # Procesamiento Fechas
-    df_clean['cosecha_str'] = df_clean[col_cosecha].astype(str).str.replace(r'\.0$', '', regex=True)
     try:
-        df_clean['fecha_dt'] = pd.to_datetime(df_clean['cosecha_str'], format='%Y%m', errors='coerce')
-    except:
-        df_clean['fecha_dt'] = pd.to_datetime(df_clean['cosecha_str'], errors='coerce')
-
-    df_clean['anio'] = df_clean['fecha_dt'].dt.year.fillna(0).astype(int).astype(str)
-    df_clean['mes_num'] = df_clean['fecha_dt'].dt.month.fillna(0).astype(int)
-    
-    mapa_meses = {1:'Ene', 2:'Feb', 3:'Mar', 4:'Abr', 5:'May', 6:'Jun', 7:'Jul', 8:'Ago', 9:'Sep', 10:'Oct', 11:'Nov', 12:'Dic', 0:'SinDato'}
-    df_clean['mes_nombre'] = df_clean['mes_num'].map(mapa_meses)
-    
-    df_clean['is_fpd2'] = df_clean[col_fpd2].astype(str).apply(lambda x: 1 if 'FPD' in x.upper() else 0)
-    df_clean['is_np'] = df_clean[col_np].astype(str).apply(lambda x: 1 if 'NP' in x.upper() else 0) if col_np else 0
-
-    if col_monto: df_clean['monto'] = pd.to_numeric(df_clean[col_monto], errors='coerce').fillna(0)
-    else: df_clean['monto'] = 0
-
-    def find_best_column(dataframe, candidates_priority, fallback_search_term):
-        for cand in candidates_priority:
-            if cand in dataframe.columns: return cand
-        possible = [c for c in dataframe.columns if fallback_search_term in c and 'id' not in c]
-        if possible: return possible[0]
-        return None
-
-    c_suc = find_best_column(df_clean, ['sucursal', 'nombre_sucursal'], 'sucursal')
-    df_clean['sucursal'] = df_clean[c_suc].fillna('Sin Dato').astype(str) if c_suc else 'Sin Dato'
-
-    c_uni = find_best_column(df_clean, ['unidad_regional', 'regional', 'region', 'unidad'], 'regional')
-    if not c_uni: c_uni = find_best_column(df_clean, [], 'unidad')
-    df_clean['unidad'] = df_clean[c_uni].fillna('Sin Dato').astype(str) if c_uni else 'Sin Dato'
+        return preparar_datos(df)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
 
-    c_prod = find_best_column(df_clean, ['producto_agrupado', 'nombre_producto', 'producto'], 'producto')
-    df_clean['producto'] = df_clean[c_prod].fillna('Sin Dato').astype(str) if c_prod else 'Sin Dato'
+# --- 2b. ÍNDICE DE DRILL-THROUGH ---
+@st.cache_resource
+def load_drill_index(_df):
+    # Se construye una sola vez por carga; el argumento con '_' no se hashea.
+    return build_drill_index(_df)
 
-    c_ori = find_best_column(df_clean, ['origen2', 'origen'], 'origen')
-    df_clean['origen'] = df_clean[c_ori].fillna('Sin Dato').astype(str).str.title() if c_ori else 'Sin Dato'
+@st.cache_resource
+def load_sample(_df):
+    # Muestra estratificada cosecha × unidad para la vista previa, precalculada por carga
+    return muestra_estratificada(_df)
 
-    c_tip = find_best_column(df_clean, ['tipo_cliente', 'tipo'], 'cliente')
-    df_clean['tipo_cliente'] = df_clean[c_tip].fillna('Sin Dato').astype(str) if c_tip else 'Sin Dato'
-    
-    df_clean['cosecha_x'] = df_clean['cosecha_str']
-    
-    return df_clean
+@st.cache_resource
+def load_opciones(_df):
+    # Ventana de cosechas y opciones de la barra lateral: una pasada por carga, no por rerun
+    ventana = ventana_cosechas(_df)
+    opciones = {col: sorted(_df[col].unique()) for col in ['unidad', 'sucursal', 'producto', 'tipo_cliente']}
+    return ventana, opciones
 
 # Cargar DATOS
 df = load_data()
+df_completo = df  # Base completa: drill-through y secciones exactas (df puede ser la muestra en vista previa)
+drill_index = load_drill_index(df)
+
+def mostrar_drill(cosecha, filtros, key, solo_fpd=False):
+    # Lista paginada de los créditos detrás de una celda agregada (sin recorrer la tabla completa)
+    posiciones = get_drill_rows(drill_index, cosecha, filtros)
+    if solo_fpd:
+        # Solo los casos FPD2 (p. ej. cuando la barra cuenta casos, no créditos)
+        posiciones = posiciones[df_completo['is_fpd2'].values[posiciones] == 1]
+    total = len(posiciones)
+    if total == 0:
+        st.info(f"No hay créditos para la selección en la cosecha {cosecha}.")
+        return
+
+    cols_drill = [c for c in COLUMNAS_EXPORT if c in df_completo.columns] + ['is_fpd2']
+    paginas = (total - 1) // FILAS_POR_PAGINA + 1
+    # Llave fija por panel; la página vuelve a 1 cuando cambia la celda seleccionada
+    seleccion = (cosecha, repr(filtros))
+    if st.session_state.get(f"{key}_seleccion") != seleccion:
+        st.session_state[f"{key}_seleccion"] = seleccion
+        st.session_state[f"{key}_pagina"] = 1
+    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key=f"{key}_pagina")
+    inicio = (pagina - 1) * FILAS_POR_PAGINA
+    fin = min(inicio + FILAS_POR_PAGINA, total)
+
+    st.caption(f"{total} créditos ({int(df_completo['is_fpd2'].values[posiciones].sum())} en FPD2) · mostrando {inicio + 1}-{fin}")
+    st.dataframe(
+        df_completo.iloc[posiciones[inicio:fin]][cols_drill].rename(columns={'is_fpd2': 'FPD2'}),
+        hide_index=True,
+        use_container_width=True
+    )
+
+# Paneles de drill-through como fragmentos: elegir celda, paginar o hacer clic en una barra
+# solo relanza el panel, no las cuatro pestañas.
+@st.fragment
+def panel_drill_bottom10(sucursales, productos, cosecha, filtros_base):
+    cd1, cd2 = st.columns(2)
+    suc_drill = cd1.selectbox("Sucursal:", sucursales, key="drill_b10_suc")
+    prod_drill = cd2.selectbox("Producto:", ["(Todos)"] + productos, key="drill_b10_prod")
+    filtros_b10 = {'sucursal': suc_drill, **filtros_base}
+    if prod_drill != "(Todos)": filtros_b10['producto'] = prod_drill
+    mostrar_drill(cosecha, filtros_b10, key="drill_b10")
+
+@st.fragment
+def panel_drill_heatmap(unidades, cosechas):
+    ch1, ch2 = st.columns(2)
+    uni_drill = ch1.selectbox("Unidad Regional:", unidades, key="drill_heat_uni")
+    cos_drill = ch2.selectbox("Cosecha:", cosechas, index=len(cosechas) - 1, key="drill_heat_cos")
+    mostrar_drill(cos_drill, {'unidad': uni_drill}, key="drill_heat")
+
+@st.fragment
+def grafica_con_drill(fig, key, cosecha, dimension, titulo, key_drill, solo_fpd=False):
+    # Clic en una barra: lista de créditos de ese valor de la dimensión ('titulo' recibe el valor)
+    evento = st.plotly_chart(fig, use_container_width=True, on_select="rerun", key=key)
+    puntos = evento.selection.points if evento else []
+    if puntos:
+        valor = puntos[0]['x']
+        with st.expander(titulo.format(valor), expanded=True):
+            mostrar_drill(cosecha, {dimension: valor}, key=key_drill, solo_fpd=solo_fpd)
+
+@st.fragment
+def panel_drill_tab(cosechas, cosecha_default):
+    cosecha_drill = st.selectbox("Cosecha:", cosechas, index=cosechas.index(cosecha_default) if cosecha_default in cosechas else 0, key="drill_cosecha")
+
+    filtros_drill = {}
+    cols_dim = st.columns(len(DIMENSIONES_DRILL))
+    for col_dim, (dim, etiqueta) in zip(cols_dim, DIMENSIONES_DRILL.items()):
+        # Opciones tomadas de las llaves del índice para esa cosecha (sin escanear df)
+        opciones = [v for (c, v) in drill_index[dim] if c == cosecha_drill]
+        opciones = LABELS_MONTO if dim == 'rango_monto' else sorted(opciones)
+        filtros_drill[dim] = col_dim.multiselect(f"{etiqueta}:", opciones, key=f"drill_{dim}")
+
+    mostrar_drill(cosecha_drill, filtros_drill, key="drill_tab")
+
+def aviso_exacto(seccion):
+    # Secciones que solo se muestran con la base completa (rankings y listados)
+    st.info(f"⏳ **{seccion}** requiere la base completa; se mostrará al terminar el cálculo exacto.")
 
 # --- 3. CONFIGURACIÓN DE VENTANA DE TIEMPO (AHORA FIJA) ---
-todas = sorted(df['cosecha_x'].unique())
-maduras = todas[:-MESES_A_EXCLUIR] if len(todas) > MESES_A_EXCLUIR else todas
-visualizar = maduras[-VENTANA_MESES:] if len(maduras) > VENTANA_MESES else maduras
+(todas, maduras, visualizar, mes_actual, mes_anterior), opciones_filtros = load_opciones(df)
 
 sel_cosecha = visualizar
 
-# Definición de la última cosecha madura
-mes_actual = maduras[-1] if len(maduras) >= 1 else None
-mes_anterior = maduras[-2] if len(maduras) >= 2 else None
-
 # --- 4. FILTROS DE NEGOCIO EN BARRA LATERAL ---
 st.sidebar.header("🎯 Filtros Generales")
 st.sidebar.info("La ventana de análisis temporal (24 meses) es fija. Los filtros de negocio aplican solo a la Pestaña 1.")
 
 st.sidebar.divider()
 st.sidebar.markdown("**Filtros de Negocio**")
-sel_uni = st.sidebar.multiselect("1. Unidad Regional:", sorted(df['unidad'].unique()))
-sel_suc = st.sidebar.multiselect("2. Sucursal:", sorted(df['sucursal'].unique()))
-sel_pro = st.sidebar.multiselect("3. Producto Agrupado:", sorted(df['producto'].unique()))
-sel_tip = st.sidebar.multiselect("4. Tipo de Cliente:", sorted(df['tipo_cliente'].unique()))
+sel_uni = st.sidebar.multiselect("1. Unidad Regional:", opciones_filtros['unidad'])
+sel_suc = st.sidebar.multiselect("2. Sucursal:", opciones_filtros['sucursal'])
+sel_pro = st.sidebar.multiselect("3. Producto Agrupado:", opciones_filtros['producto'])
+sel_tip = st.sidebar.multiselect("4. Tipo de Cliente:", opciones_filtros['tipo_cliente'])
 
-# --- 5. PREPARACIÓN BASE FILTRADA (PESTAÑA 1) ---
-df_base = df.copy()
+st.sidebar.divider()
+modo_preview = st.sidebar.toggle("⚡ Vista previa rápida", value=False, help="Muestra primero todas las gráficas con una muestra estratificada (cosecha × unidad) y después las reemplaza con los resultados exactos.")
+
+# --- 4b. VISTA PREVIA (MUESTRA ESTRATIFICADA) ---
+# Fase 1: se pinta con la muestra y se relanza el script. Fase 2: se calcula con la base completa y reemplaza lo anterior.
+# Solo hay vista previa cuando cambian los filtros o el toggle; cualquier otra interacción (paginar, clic en barras) va directo al cálculo exacto.
+clave_preview = (tuple(sel_uni), tuple(sel_suc), tuple(sel_pro), tuple(sel_tip), modo_preview)
+es_preview = False
+if modo_preview and st.session_state.get('clave_preview') != clave_preview:
+    df_muestra = load_sample(df_completo)
+    if len(df_muestra) < len(df_completo):
+        es_preview = True
+        df = df_muestra
 
-if sel_uni: df_base = df_base[df_base['unidad'].isin(sel_uni)]
-if sel_suc: df_base = df_base[df_base['sucursal'].isin(sel_suc)]
-if sel_pro: df_base = df_base[df_base['producto'].isin(sel_pro)]
-if sel_tip: df_base = df_base[df_base['tipo_cliente'].isin(sel_tip)]
+# --- 5. PREPARACIÓN BASE FILTRADA (PESTAÑA 1) ---
+df_base = filtrar_base(df, sel_uni, sel_suc, sel_pro, sel_tip)
 
 if df_base.empty:
     st.sidebar.warning("⚠️ Los filtros seleccionados no devolvieron datos para el Monitor.")
@@ -137,36 +187,29 @@ df_top = df_base[df_base['cosecha_x'].isin(sel_cosecha)]
 # --- CÁLCULO CENTRALIZADO DEL BOTTOM 10 DE SUCURSALES ---
 # =========================================================
 
-worst_10_sucursales = []
-df_ranking_calc = pd.DataFrame()
-
 # *** CAMBIO: Usar solo la última cosecha madura para el ranking de la Pestaña 1 ***
-if mes_actual and not df_base.empty:
-    df_ranking_base = df_base[df_base['cosecha_x'] == mes_actual].copy()
-else:
-    df_ranking_base = pd.DataFrame()
-
-if not df_ranking_base.empty:
-    # 1. Base para el Ranking (Excluir '999' y 'nomina')
-    mask_999 = df_ranking_base['sucursal'].astype(str).str.contains("999", na=False)
-    mask_nomina = df_ranking_base['sucursal'].astype(str).str.lower().str.contains("nomina colaboradores", na=False)
-    df_ranking_calc = df_ranking_base[~(mask_999 | mask_nomina)]
-    
-    # 2. Agregar 'sum' para contar los casos FPD
-    r_calc = df_ranking_calc.groupby('sucursal')['is_fpd2'].agg(['count', 'sum', 'mean']).reset_index()
-    
-    r_clean_calc = r_calc[r_calc['count'] >= MIN_CREDITOS_RANKING]
-
-    # 3. Obtener el Bottom 10 (peores tasas)
-    if not r_clean_calc.empty:
-        bottom_10_df = r_clean_calc.sort_values('mean', ascending=False).head(10)
-        worst_10_sucursales = bottom_10_df['sucursal'].tolist()
+# En vista previa no se calcula: las secciones que lo usan muestran aviso_exacto()
+if not es_preview:
+    df_ranking_calc, r_clean_calc, worst_10_sucursales = ranking_sucursales(df_base, mes_actual)
+
+if es_preview and mes_actual:
+    # Margen de la tasa que muestra la Pestaña 1: filas de la muestra en df_base (filtrado) para mes_actual;
+    # N sale del índice de drill-through con los mismos filtros (sin recorrer la base completa).
+    muestra_mes = df_base[df_base['cosecha_x'] == mes_actual]['is_fpd2']
+    N_mes = len(get_drill_rows(drill_index, mes_actual, {'unidad': sel_uni, 'sucursal': sel_suc, 'producto': sel_pro, 'tipo_cliente': sel_tip}))
+    if len(muestra_mes) > 0:
+        margen = margen_error(muestra_mes.mean(), len(muestra_mes), N_mes) * 100
+        texto_margen = f"Margen de error aprox. ±{margen:.1f} pp en el FPD2 de la cosecha {mes_actual} con los filtros de la Pestaña 1 ({len(muestra_mes):,} de {N_mes:,} créditos en la muestra; mayor en celdas pequeñas)."
+    else:
+        texto_margen = f"La muestra no tiene créditos de la cosecha {mes_actual} con los filtros actuales."
+    st.info(f"⚡ **Vista previa** con una muestra estratificada de {len(df):,} de {len(df_completo):,} créditos (cosecha × unidad). "
+            f"{texto_margen} Calculando resultados exactos…")
 
 
 # =========================================================
 # --- PESTAÑAS ---
 # =========================================================
-tab1, tab2, tab3, tab4 = st.tabs(["📉 Monitor FPD", "📋 Resumen Ejecutivo", "🎯 Insights Estratégicos","Exportar"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["📉 Monitor FPD", "📋 Resumen Ejecutivo", "🎯 Insights Estratégicos","Exportar", "🔎 Drill-through"])
 
 # --- PESTAÑA 1: MONITOR FPD ---
 with tab1:
@@ -179,19 +222,15 @@ with tab1:
         with col1:
             st.subheader("1. Tendencia Global")
             if not df_top.empty:
-                d = df_top.groupby('cosecha_x')['is_fpd2'].mean().reset_index()
-                d['FPD2 %'] = d['is_fpd2']*100
+                d = tendencia_global(df_top)
                 fig = px.line(d, x='cosecha_x', y='FPD2 %', markers=True, text=d['FPD2 %'].apply(lambda x: f'{x:.1f}%'))
                 fig.update_traces(line_color='#FF4B4B', line_width=3, textposition="top center")
                 fig.update_layout(xaxis_type='category')
                 st.plotly_chart(fig, use_container_width=True)
         with col2:
             st.subheader("2. Físico vs Digital")
-            mask = df_top['origen'].str.contains('Fisico|Digital', case=False, na=False)
-            d_comp = df_top[mask].copy()
-            if not d_comp.empty:
-                d = d_comp.groupby(['cosecha_x', 'origen'])['is_fpd2'].mean().reset_index()
-                d['FPD2 %'] = d['is_fpd2']*100
+            d = fisico_vs_digital(df_top)
+            if not d.empty:
                 fig = px.line(d, x='cosecha_x', y='FPD2 %', color='origen', markers=True, color_discrete_map={'Fisico': '#1f77b4', 'Digital': '#2ca02c'})
                 fig.update_layout(xaxis_type='category', legend=dict(orientation="h", y=-0.2, x=0.5, xanchor="center"))
                 st.plotly_chart(fig, use_container_width=True)
@@ -202,7 +241,9 @@ with tab1:
         
         st.subheader(f"3. Ranking de Sucursales (Cosecha {mes_actual})") # Actualiza el título
         
-        if not df_ranking_calc.empty and not r_clean_calc.empty:
+        if es_preview:
+            aviso_exacto("Ranking de Sucursales")
+        elif not df_ranking_calc.empty and not r_clean_calc.empty:
             c1, c2 = st.columns(2)
             
             # Crear la columna FPD2 % como valor * 100 para el formato de número
@@ -245,18 +286,9 @@ with tab1:
 
         with cy1:
             st.markdown("##### Comparativo Anual (Mes a Mes)")
-            todas_neg = sorted(df_base['cosecha_x'].unique())
-            cosechas_maduras_globales = todas_neg[:-MESES_A_EXCLUIR] if len(todas_neg) > MESES_A_EXCLUIR else todas_neg
+            dy = comparativo_anual(df_base)
             
-            df_yoy = df_base[
-                (df_base['cosecha_x'].isin(cosechas_maduras_globales)) & 
-                (df_base['anio'].isin(['2023', '2024', '2025']))
-            ].copy()
-            
-            if not df_yoy.empty:
-                dy = df_yoy.groupby(['mes_num', 'mes_nombre', 'anio'])['is_fpd2'].mean().reset_index()
-                dy['FPD2 %'] = dy['is_fpd2'] * 100
-                dy = dy.sort_values('mes_num')
+            if not dy.empty:
                 dy['etiqueta'] = dy.apply(lambda r: f"{r['FPD2 %']:.1f}%" if r['anio'] == '2025' else None, axis=1)
                 
                 fig_yoy = px.line(dy, x='mes_nombre', y='FPD2 %', color='anio', markers=True, text='etiqueta',
@@ -269,11 +301,8 @@ with tab1:
 
         with cy2:
             st.markdown(f"##### Histórico Indicadores ({visualizar[0]} - {visualizar[-1]})")
-            df_ind = df_base[df_base['cosecha_x'].isin(visualizar)].copy()
-            if not df_ind.empty:
-                dh = df_ind.groupby('cosecha_x')[['is_fpd2', 'is_np']].mean().reset_index()
-                dh['% FPD'] = dh['is_fpd2'] * 100
-                dh['% NP'] = dh['is_np'] * 100
+            dh = historico_indicadores(df_base, visualizar)
+            if not dh.empty:
                 dh_melt = dh.melt(id_vars=['cosecha_x'], value_vars=['% FPD', '% NP'], var_name='Indicador', value_name='Porcentaje')
                 dh_melt['etiqueta'] = dh_melt['Porcentaje'].map('{:.1f}%'.format)
                 fig_ind = px.line(dh_melt, x='cosecha_x', y='Porcentaje', color='Indicador', markers=True, text='etiqueta', color_discrete_map={'% FPD': '#d62728', '% NP': '#ff7f0e'})
@@ -285,12 +314,9 @@ with tab1:
 
         st.divider()
         st.subheader("5. Evolución por Tipo de Cliente")
-        df_tipo = df_base[df_base['cosecha_x'].isin(visualizar)].copy()
-        df_tipo = df_tipo[~df_tipo['tipo_cliente'].astype(str).str.lower().str.contains('former')]
+        dt = evolucion_tipo_cliente(df_base, visualizar)
         
-        if not df_tipo.empty:
-            dt = df_tipo.groupby(['cosecha_x', 'tipo_cliente'])['is_fpd2'].mean().reset_index()
-            dt['FPD2 %'] = dt['is_fpd2'] * 100
+        if not dt.empty:
             dt['etiqueta'] = dt['FPD2 %'].map('{:.1f}%'.format)
             fig_tipo = px.line(dt, x='cosecha_x', y='FPD2 %', color='tipo_cliente', markers=True, text='etiqueta', title=f"Comportamiento FPD por Tipo Cliente ({visualizar[0]} - {visualizar[-1]})")
             fig_tipo.update_traces(textposition="top center")
@@ -310,9 +336,7 @@ with tab2:
         
         # --- BLOQUE 1: UNIDAD REGIONAL (GLOBAL) ---
         st.markdown(f"#### 🌍 Análisis Regional ({mes_actual})")
-        df_resumen = df[df['cosecha_x'] == mes_actual]
-        df_resumen_clean = df_resumen[~df_resumen['unidad'].astype(str).str.lower().str.contains("pr nominas", case=False)]
-        resumen_unidad = df_resumen_clean.groupby('unidad')['is_fpd2'].mean().reset_index()
+        resumen_unidad = resumen_regional(df, mes_actual)
         
         if not resumen_unidad.empty:
             mejor = resumen_unidad.loc[resumen_unidad['is_fpd2'].idxmin()]
@@ -341,94 +365,79 @@ with tab2:
         # --- BLOQUE 2: PRODUCTOS (GLOBAL) ---
         st.markdown(f"#### 📦 Análisis de Productos ({mes_actual})")
         
-        resumen_prod = df_resumen.groupby('producto').agg(
-            tasa=('is_fpd2', 'mean'),
-            conteo_total=('is_fpd2', 'count'),
-            conteo_fpd=('is_fpd2', 'sum')
-        ).reset_index()
-        
-        resumen_prod = resumen_prod[resumen_prod['conteo_total'] >= MIN_CREDITOS_RANKING]
-        promedio_global = df_resumen['is_fpd2'].mean()
-        
-        if not resumen_prod.empty:
-            prod_mejor = resumen_prod.sort_values(by=['tasa', 'conteo_total'], ascending=[True, False]).iloc[0]
-            prod_peor = resumen_prod.sort_values(by=['tasa', 'conteo_total'], ascending=[False, False]).iloc[0]
+        if es_preview:
+            aviso_exacto("Análisis de Productos")
+        else:
+            resumen_prod, promedio_global = resumen_productos(df, mes_actual)
+            if not resumen_prod.empty:
+                prod_mejor = resumen_prod.sort_values(by=['tasa', 'conteo_total'], ascending=[True, False]).iloc[0]
+                prod_peor = resumen_prod.sort_values(by=['tasa', 'conteo_total'], ascending=[False, False]).iloc[0]
             
-            col_p1, col_p2 = st.columns(2)
-            with col_p1:
-                st.markdown(f"""
-                <div style='background-color: #e3f2fd; padding: 20px; border-radius: 12px; border: 1px solid #bbdefb;'>
-                    <h3 style='color: #1565c0; margin:0;'>🏆 Mejor Producto</h3>
-                    <h4 style='margin:5px 0;'>{prod_mejor['producto']}</h4>
-                    <h2 style='color: #1565c0; font-size: 2.5em; margin: 0;'>{prod_mejor['tasa']*100:.2f}%</h2>
-                    <p style='color: #555; margin-top: 10px;'>
-                        <b>{int(prod_mejor['conteo_fpd'])}</b> créditos en FPD<br>
-                        de <b>{int(prod_mejor['conteo_total'])}</b> colocados.
-                    </p>
-                </div>
-                """, unsafe_allow_html=True)
-            with col_p2:
-                st.markdown(f"""
-                <div style='background-color: #fff3e0; padding: 20px; border-radius: 12px; border: 1px solid #ffe0b2;'>
-                    <h3 style='color: #e65100; margin:0;'>⚠️ Mayor Riesgo FPD</h3>
-                    <h4 style='margin:5px 0;'>{prod_peor['producto']}</h4>
-                    <h2 style='color: #e65100; font-size: 2.5em; margin: 0;'>{prod_peor['tasa']*100:.2f}%</h2>
-                    <p style='color: #555; margin-top: 10px;'>
-                        <b>{int(prod_peor['conteo_fpd'])}</b> créditos en FPD<br>
-                        de <b>{int(prod_peor['conteo_total'])}</b> colocados.
-                    </p>
-                </div>
-                """, unsafe_allow_html=True)
+                col_p1, col_p2 = st.columns(2)
+                with col_p1:
+                    st.markdown(f"""
+                    <div style='background-color: #e3f2fd; padding: 20px; border-radius: 12px; border: 1px solid #bbdefb;'>
+                        <h3 style='color: #1565c0; margin:0;'>🏆 Mejor Producto</h3>
+                        <h4 style='margin:5px 0;'>{prod_mejor['producto']}</h4>
+                        <h2 style='color: #1565c0; font-size: 2.5em; margin: 0;'>{prod_mejor['tasa']*100:.2f}%</h2>
+                        <p style='color: #555; margin-top: 10px;'>
+                            <b>{int(prod_mejor['conteo_fpd'])}</b> créditos en FPD<br>
+                            de <b>{int(prod_mejor['conteo_total'])}</b> colocados.
+                        </p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                with col_p2:
+                    st.markdown(f"""
+                    <div style='background-color: #fff3e0; padding: 20px; border-radius: 12px; border: 1px solid #ffe0b2;'>
+                        <h3 style='color: #e65100; margin:0;'>⚠️ Mayor Riesgo FPD</h3>
+                        <h4 style='margin:5px 0;'>{prod_peor['producto']}</h4>
+                        <h2 style='color: #e65100; font-size: 2.5em; margin: 0;'>{prod_peor['tasa']*100:.2f}%</h2>
+                        <p style='color: #555; margin-top: 10px;'>
+                            <b>{int(prod_peor['conteo_fpd'])}</b> créditos en FPD<br>
+                            de <b>{int(prod_peor['conteo_total'])}</b> colocados.
+                        </p>
+                    </div>
+                    """, unsafe_allow_html=True)
             
-            with st.expander("Ver tabla completa de productos (Coloreada)"):
-                df_view = resumen_prod.copy()
-                df_view = df_view.rename(columns={'producto': 'Producto', 'conteo_total': 'Total Créditos', 'conteo_fpd': 'Créditos FPD', 'tasa': 'Tasa %'})
-                df_view = df_view.sort_values('Tasa %', ascending=False)
+                with st.expander("Ver tabla completa de productos (Coloreada)"):
+                    df_view = resumen_prod.copy()
+                    df_view = df_view.rename(columns={'producto': 'Producto', 'conteo_total': 'Total Créditos', 'conteo_fpd': 'Créditos FPD', 'tasa': 'Tasa %'})
+                    df_view = df_view.sort_values('Tasa %', ascending=False)
                 
-                def estilo_tasas(val):
-                    color = '#d32f2f' if val > promedio_global else '#2e7d32'
-                    weight = 'bold'
-                    return f'color: {color}; font-weight: {weight}'
-
-                st.dataframe(
-                    df_view.style
-                    .applymap(estilo_tasas, subset=['Tasa %'])
-                    .format({'Tasa %': '{:.2%}'})
-                    .applymap(lambda x: 'font-weight: bold', subset=['Producto']),
-                    use_container_width=True,
-                    hide_index=True
-                )
-        else:
-            st.warning("No hay productos con suficientes créditos para evaluar.")
+                    def estilo_tasas(val):
+                        color = '#d32f2f' if val > promedio_global else '#2e7d32'
+                        weight = 'bold'
+                        return f'color: {color}; font-weight: {weight}'
+
+                    st.dataframe(
+                        df_view.style
+                        .applymap(estilo_tasas, subset=['Tasa %'])
+                        .format({'Tasa %': '{:.2%}'})
+                        .applymap(lambda x: 'font-weight: bold', subset=['Producto']),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+            else:
+                st.warning("No hay productos con suficientes créditos para evaluar.")
 
         st.divider()
 
         # --- BLOQUE 3: COMPARATIVA SUCURSALES (GLOBAL) ---
         st.markdown(f"#### 🏦 Comparativa de Sucursales ({mes_anterior} vs {mes_actual})")
         
-        df_comp = df[df['cosecha_x'].isin([mes_anterior, mes_actual])].copy()
-        mask_999 = df_comp['sucursal'].astype(str).str.contains("999", na=False)
-        mask_nom = df_comp['sucursal'].astype(str).str.lower().str.contains("nomina colaboradores", na=False)
-        df_comp = df_comp[~(mask_999 | mask_nom)]
-        
-        pivot = df_comp.groupby(['sucursal', 'cosecha_x']).agg(tasa=('is_fpd2', 'mean'), conteo=('is_fpd2', 'count')).reset_index()
-        
-        pivot_tasa = pivot.pivot(index='sucursal', columns='cosecha_x', values='tasa')
-        pivot_count = pivot.pivot(index='sucursal', columns='cosecha_x', values='conteo')
-        
-        if mes_actual in pivot_tasa.columns and mes_anterior in pivot_tasa.columns:
-            validas = pivot_count[(pivot_count[mes_actual] >= MIN_CREDITOS_RANKING) & (pivot_count[mes_anterior] > 0)].index
-            df_final_comp = pivot_tasa.loc[validas]
-            
+        if es_preview:
+            aviso_exacto("Comparativa de Sucursales")
+        else:
+            df_final_comp = comparativa_sucursales(df, mes_anterior, mes_actual)
             if not df_final_comp.empty:
                 suc_mejor = df_final_comp[mes_actual].idxmin()
                 val_mejor_act = df_final_comp.loc[suc_mejor, mes_actual] * 100
                 val_mejor_ant = df_final_comp.loc[suc_mejor, mes_anterior] * 100
-                
+            
                 suc_peor = df_final_comp[mes_actual].idxmax()
                 val_peor_act = df_final_comp.loc[suc_peor, mes_actual] * 100
                 val_peor_ant = df_final_comp.loc[suc_peor, mes_anterior] * 100
-                
+            
                 st.markdown(f"""
                 <div style='background-color: #fff8e1; padding: 15px; border-radius: 10px; border-left: 5px solid #ffb300;'>
                     <p>🏆 <b>Mejor Comportamiento:</b> <b>{suc_mejor}</b><br>
@@ -448,23 +457,13 @@ with tab2:
         st.markdown("#### 4. Detalle de Riesgo por Producto y Sucursal (Bottom 10)")
         st.markdown("⚠️ **Nota:** Esta tabla muestra **(Casos FPD | Total Casos | % FPD)** para las **10 sucursales con mayor riesgo**, según los filtros de negocio aplicados.")
 
-        if worst_10_sucursales:
-            # 1. Usar df_base (filtrado por sidebar) y el mes actual
-            df_detalle = df_base[df_base['cosecha_x'] == mes_actual].copy()
-            
-            # 2. FILTRAR POR EL BOTTOM 10 CALCULADO
-            df_detalle = df_detalle[df_detalle['sucursal'].isin(worst_10_sucursales)]
+        if es_preview:
+            aviso_exacto("Detalle Bottom 10")
+        elif worst_10_sucursales:
+            # 1-3. df_base (filtrado por sidebar) del mes actual, solo el Bottom 10: Casos / Total / Tasa por Sucursal y Producto
+            pivot_data = detalle_bottom10(df_base, mes_actual, worst_10_sucursales)
             
-            df_detalle = df_detalle[~df_detalle['sucursal'].astype(str).str.contains("999", na=False)]
-            
-            if not df_detalle.empty:
-                # 3. Calcular FPD % / Casos / Total por Sucursal y Producto
-                pivot_data = df_detalle.groupby(['sucursal', 'producto']).agg(
-                    FPD_Casos=('is_fpd2', 'sum'),
-                    Total_Casos=('is_fpd2', 'count'),
-                    FPD_Tasa=('is_fpd2', 'mean') 
-                ).reset_index()
-                
+            if not pivot_data.empty:
                 # Convertir Casos a string (entero)
                 pivot_data['FPD_Casos'] = pivot_data['FPD_Casos'].fillna(0).astype(int).astype(str)
                 pivot_data['Total_Casos'] = pivot_data['Total_Casos'].fillna(0).astype(int).astype(str)
@@ -507,6 +506,14 @@ with tab2:
                     .set_properties(**{'font-size': '10pt'}) 
                 
                 st.dataframe(styled_table, use_container_width=True)
+
+                with st.expander("🔎 Ver créditos de una celda"):
+                    panel_drill_bottom10(
+                        worst_10_sucursales,
+                        list(table_pivot.columns.get_level_values('Producto').unique()),
+                        mes_actual,
+                        {'unidad': sel_uni, 'producto': sel_pro, 'tipo_cliente': sel_tip}
+                    )
             else:
                 st.warning(f"No hay datos para la cosecha {mes_actual} con el Bottom 10 de sucursales filtrado.")
 
@@ -524,13 +531,7 @@ with tab3:
         # 1. HEATMAP DE RIESGO REGIONAL (Últimos 6 meses)
         st.subheader("1. Mapa de Calor de Riesgo Regional (Últimos 6 meses)")
         ultimos_6 = maduras[-6:]
-        df_heat = df[df['cosecha_x'].isin(ultimos_6)].copy()
-        df_heat = df_heat[~df_heat['unidad'].astype(str).str.lower().str.contains("pr nominas", case=False)]
-        
-        pivot_heat = df_heat.groupby(['unidad', 'cosecha_x'])['is_fpd2'].mean().reset_index()
-        pivot_heat['FPD2 %'] = pivot_heat['is_fpd2'] * 100
-        
-        heatmap_data = pivot_heat.pivot(index='unidad', columns='cosecha_x', values='FPD2 %')
+        heatmap_data = heatmap_regional(df, ultimos_6)
         
         fig_heat = px.imshow(
             heatmap_data,
@@ -545,6 +546,9 @@ with tab3:
         fig_heat.update_layout(title="Evolución del Riesgo por Región")
         st.plotly_chart(fig_heat, use_container_width=True)
 
+        with st.expander("🔎 Ver créditos de una celda del mapa"):
+            panel_drill_heatmap(list(heatmap_data.index), list(heatmap_data.columns))
+
     st.divider()
 
     # 2. PARETO DE SUCURSALES (80/20)
@@ -552,38 +556,25 @@ with tab3:
     st.markdown("Identificamos qué porcentaje de sucursales concentra el 80% de los casos de FPD en la **última cosecha madura**.")
     
     ultima = mes_actual # Ya está definido al inicio
-    df_pareto = df[df['cosecha_x'] == ultima].copy()
-    
-    mask_999 = df_pareto['sucursal'].astype(str).str.contains("999", na=False)
-    mask_nom = df_pareto['sucursal'].astype(str).str.lower().str.contains("nomina colaboradores", na=False)
-    df_pareto = df_pareto[~(mask_999 | mask_nom)]
-    
-    pareto = df_pareto.groupby('sucursal')['is_fpd2'].sum().reset_index()
-    pareto = pareto.sort_values('is_fpd2', ascending=False)
-    pareto = pareto[pareto['is_fpd2'] > 0]
-    
-    pareto['Acumulado'] = pareto['is_fpd2'].cumsum()
-    pareto['% Acumulado'] = pareto['is_fpd2'].cumsum() / pareto['is_fpd2'].sum() * 100
-    pareto['Rank'] = range(1, len(pareto) + 1)
-    
-    corte_80 = pareto[pareto['% Acumulado'] <= 80]
-    num_sucursales_80 = len(corte_80)
-    total_sucursales = len(pareto)
-    pct_sucursales = (num_sucursales_80 / total_sucursales * 100) if total_sucursales > 0 else 0
+    if es_preview:
+        aviso_exacto("Pareto de Sucursales")
+    else:
+        pareto, num_sucursales_80, total_sucursales, pct_sucursales = pareto_sucursales(df, ultima)
     
-    col_p1, col_p2 = st.columns([1, 3])
-    with col_p1:
-        st.info(f"""
-        **El Principio 80/20 en acción:**
+        col_p1, col_p2 = st.columns([1, 3])
+        with col_p1:
+            st.info(f"""
+            **El Principio 80/20 en acción:**
         
-        El **{pct_sucursales:.1f}%** de las sucursales con FPD ({num_sucursales_80} de {total_sucursales}) generan el **80%** de todos los casos de impago.
-        """)
-        st.metric(label="Total Casos FPD", value=int(pareto['is_fpd2'].sum()))
+            El **{pct_sucursales:.1f}%** de las sucursales con FPD ({num_sucursales_80} de {total_sucursales}) generan el **80%** de todos los casos de impago.
+            """)
+            st.metric(label="Total Casos FPD", value=int(pareto['is_fpd2'].sum()))
     
-    with col_p2:
-        fig_pareto = px.bar(pareto.head(30), x='sucursal', y='is_fpd2', title="Top 30 Sucursales con más casos (Volumen)", labels={'is_fpd2': 'Casos FPD'})
-        fig_pareto.update_traces(marker_color='#d62728')
-        st.plotly_chart(fig_pareto, use_container_width=True)
+        with col_p2:
+            fig_pareto = px.bar(pareto.head(30), x='sucursal', y='is_fpd2', title="Top 30 Sucursales con más casos (Volumen)", labels={'is_fpd2': 'Casos FPD'})
+            fig_pareto.update_traces(marker_color='#d62728')
+            # Drill-through: clic en una barra del Pareto (la barra cuenta casos FPD, la lista también)
+            grafica_con_drill(fig_pareto, "pareto_drill", ultima, 'sucursal', f"🔎 Casos FPD2 de {{}} (Cosecha {ultima})", "drill_pareto", solo_fpd=True)
 
     st.divider()
 
@@ -591,15 +582,11 @@ with tab3:
     st.subheader("3. Sensibilidad al Riesgo por Monto Otorgado")
     st.markdown(f"Análisis de la cosecha **{ultima}**. ¿Los créditos más grandes tienen peor comportamiento?")
     
-    df_monto = df[df['cosecha_x'] == ultima].copy()
-    
-    bins = [0, 3000, 5000, 8000, 12000, 20000, 1000000]
-    labels = ['0-3k', '3k-5k', '5k-8k', '8k-12k', '12k-20k', '>20k']
-    
-    df_monto['rango_monto'] = pd.cut(df_monto['monto'], bins=bins, labels=labels)
-    
-    resumen_monto = df_monto.groupby('rango_monto')['is_fpd2'].agg(['mean', 'count']).reset_index()
-    resumen_monto['FPD2 %'] = resumen_monto['mean'] * 100
+    resumen_monto = sensibilidad_monto(df, ultima)
+    if es_preview:
+        # Volumen de la muestra expandido a la base completa de la cosecha (asignación proporcional)
+        factor_expansion = len(drill_index['cosecha_x'].get(ultima, [])) / max((df['cosecha_x'] == ultima).sum(), 1)
+        resumen_monto['count'] = (resumen_monto['count'] * factor_expansion).round()
     
     fig_dual = go.Figure()
     
@@ -630,7 +617,8 @@ with tab3:
         hovermode="x unified"
     )
     
-    st.plotly_chart(fig_dual, use_container_width=True)
+    # Drill-through: clic en un rango de monto
+    grafica_con_drill(fig_dual, "monto_drill", ultima, 'rango_monto', f"🔎 Créditos del rango {{}} (Cosecha {ultima})", "drill_monto")
 with tab4:
     st.header("💾 Exportación de Casos Críticos")
     st.markdown("""
@@ -639,27 +627,14 @@ with tab4:
     """)
 
     # 1. Identificar la cosecha "Siguiente" (la última de la lista 'todas')
-    if len(todas) > 0:
+    if es_preview:
+        aviso_exacto("Exportación de Casos FPD2")
+    elif len(todas) > 0:
         cosecha_objetivo = todas[-2]  # Esto tomaría '202510' si es la última en el archivo
         
-        # 2. Filtrar el dataframe original (sin los filtros de la sidebar)
-        # Queremos los datos puros para exportar
-        df_export = df[
-            (df['cosecha_x'] == cosecha_objetivo) & 
-            (df['is_fpd2'] == 1)
-        ].copy()
-
-        # 3. Selección y Renombre de columnas solicitadas
+        # 2-3. Dataframe original (sin los filtros de la sidebar) con las columnas solicitadas
         # Nota: load_data() convierte todo a minúsculas, usamos los nombres normalizados
-        columnas_req = [
-            'id_credito', 'id_segmento', 'id_producto', 
-            'producto_agrupado', 'origen2', 'cosecha', 
-            'monto_otorgado', 'cuota', 'sucursal'
-        ]
-
-        # Validamos que las columnas existan antes de filtrar para evitar errores
-        cols_finales = [c for c in columnas_req if c in df_export.columns]
-        df_final_export = df_export[cols_finales]
+        df_final_export = casos_exportar(df, cosecha_objetivo)
 
         # 4. Interfaz de usuario
         col_exp1, col_exp2 = st.columns([1, 2])
@@ -719,3 +694,18 @@ with tab4:
         # 1. Filtrar los datos para la cosecha específica
 cosecha_target = todas[-2]
 df_pie_data = df[df['cosecha_x'] == cosecha_target].copy()
+
+# --- PESTAÑA 5: DRILL-THROUGH ---
+with tab5:
+    st.header("🔎 Drill-through: Créditos detrás de cada celda")
+    st.markdown("Selecciona una cosecha y cualquier combinación de dimensiones para ver los créditos que componen esa celda. La búsqueda usa un índice precalculado al cargar los datos (sin recorrer la base completa).")
+
+    if todas:
+        panel_drill_tab(todas[::-1], mes_actual)
+    else:
+        st.error("No hay datos disponibles para el drill-through.")
+
+# --- VISTA PREVIA: REEMPLAZO POR RESULTADOS EXACTOS ---
+st.session_state['clave_preview'] = clave_preview
+if es_preview:
+    st.rerun()
@@ -0,0 +1,405 @@
+import argparse
+import importlib
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import calculos_fpd as referencia
+
+# =========================================================
+# ARNÉS DE EQUIVALENCIA Y RENDIMIENTO
+# Compara un motor alternativo (módulo con las mismas funciones que
+# calculos_fpd.py) contra la implementación de referencia, sección por
+# sección: columnas derivadas por preparar_datos, tasas, conteos, rankings
+# y cortes de Pareto dentro de tolerancia, más presupuestos de latencia y
+# memoria. Cada motor calcula sobre la base que él mismo preparó.
+#
+# Uso:
+#   python verificar_equivalencia.py                        # referencia vs. sí misma
+#   python verificar_equivalencia.py --motor mi_motor       # motor alternativo
+#   python verificar_equivalencia.py --datos anonimizado.csv --golden golden/
+# =========================================================
+
+TOLERANCIA = 1e-9
+REPETICIONES = 3
+MAX_REGRESION = 1.5  # el motor alternativo no puede ser más lento que referencia × este factor
+
+# Columnas derivadas por preparar_datos() que consumen las secciones
+COLUMNAS_PREPARADAS = ['cosecha_x', 'is_fpd2', 'is_np', 'monto', 'sucursal', 'unidad', 'producto', 'origen', 'tipo_cliente', 'rango_monto']
+
+# Presupuestos por sección para FILAS_PRESUPUESTO créditos: (milisegundos, MB pico).
+# Se escalan linealmente con el tamaño de la base, con un piso para bases chicas
+# donde domina el costo fijo.
+FILAS_PRESUPUESTO = 200_000
+ESCALA_MINIMA = 0.25
+PRESUPUESTOS = {
+    'preparar_datos': (1500, 300),
+    'ranking_sucursales': (250, 150),
+    'tendencia_global': (250, 150),
+    'fisico_vs_digital': (400, 150),
+    'comparativo_anual': (400, 200),
+    'historico_indicadores': (400, 200),
+    'evolucion_tipo_cliente': (500, 200),
+    'resumen_regional': (250, 150),
+    'resumen_productos': (250, 150),
+    'comparativa_sucursales': (250, 150),
+    'detalle_bottom10': (250, 150),
+    'heatmap_regional': (300, 150),
+    'pareto_sucursales': (250, 150),
+    'sensibilidad_monto': (250, 150),
+    'casos_exportar': (250, 150),
+}
+
+
+# --- 1. DATOS ---
+def generar_datos_sinteticos(n_filas=200_000, n_sucursales=300, semilla=0):
+    # Archivo crudo con la forma de 'fpd gemini.xlsx', incluyendo los casos que
+    # el dashboard excluye ('999', 'nomina colaboradores', 'pr nominas', 'former')
+    # y sucursales con menos de MIN_CREDITOS_RANKING créditos.
+    rng = np.random.default_rng(semilla)
+
+    cosechas = pd.period_range('2023-01', periods=30, freq='M').strftime('%Y%m').astype(int)
+    unidades = [f'REGION {i}' for i in range(1, 9)] + ['PR NOMINAS']
+    sucursales = [f'SUC {i:03d}' for i in range(1, n_sucursales + 1)] + ['999 CORPORATIVO', 'NOMINA COLABORADORES']
+    productos = ['MERCANCIA', 'EFECTIVO', 'NOMINA', 'PERSONAL', 'AUTO']
+    tipos = ['NUEVO', 'RENOVACION', 'FORMER']
+
+    # Sucursales pequeñas: peso bajo para que algunas queden bajo el umbral de ranking
+    peso_suc = rng.pareto(1.5, len(sucursales)) + 0.01
+    peso_suc /= peso_suc.sum()
+    idx_suc = rng.choice(len(sucursales), n_filas, p=peso_suc)
+    uni_por_suc = rng.integers(0, len(unidades), len(sucursales))
+
+    riesgo_suc = rng.beta(2, 20, len(sucursales))
+    monto = np.round(rng.lognormal(8.6, 0.7, n_filas), 2)
+    riesgo = riesgo_suc[idx_suc] * np.where(monto > 12000, 1.3, 1.0)
+    es_fpd = rng.random(n_filas) < riesgo
+    es_np = rng.random(n_filas) < riesgo / 2
+
+    return pd.DataFrame({
+        'ID_CREDITO': np.arange(1, n_filas + 1),
+        'ID_SEGMENTO': rng.integers(1, 6, n_filas),
+        'ID_PRODUCTO': rng.integers(100, 120, n_filas),
+        'COSECHA': rng.choice(cosechas, n_filas),
+        'FPD2': np.where(es_fpd, 'FPD2', 'AL CORRIENTE'),
+        'NP': np.where(es_np, 'NP', 'PAGO'),
+        'MONTO_OTORGADO': monto,
+        'CUOTA': np.round(monto / rng.choice([12, 18, 24], n_filas), 2),
+        'SUCURSAL': np.array(sucursales)[idx_suc],
+        'UNIDAD_REGIONAL': np.array(unidades)[uni_por_suc[idx_suc]],
+        'PRODUCTO_AGRUPADO': rng.choice(productos, n_filas),
+        'ORIGEN2': rng.choice(['FISICO', 'DIGITAL', 'ALIADO'], n_filas, p=[0.6, 0.35, 0.05]),
+        'TIPO_CLIENTE': rng.choice(tipos, n_filas, p=[0.45, 0.45, 0.10]),
+    })
+
+
+def cargar_archivo(ruta):
+    # Mismo lector que load_data() en dashboard.py (dataset anonimizado)
+    if ruta.endswith('.xlsx'):
+        return pd.read_excel(ruta)
+    return pd.read_csv(ruta, encoding='latin1')
+
+
+# --- 2. SECCIONES ---
+def contexto(df, filtros, motor=referencia):
+    todas, maduras, visualizar, mes_actual, mes_anterior = motor.ventana_cosechas(df)
+    df_base = motor.filtrar_base(df, **filtros)
+    return {
+        'df': df,
+        'df_base': df_base,
+        'df_top': df_base[df_base['cosecha_x'].isin(visualizar)],
+        'visualizar': visualizar,
+        'mes_actual': mes_actual,
+        'mes_anterior': mes_anterior,
+        'ultimos_6': maduras[-6:],
+        'cosecha_objetivo': todas[-2] if len(todas) >= 2 else None,
+    }
+
+
+def _ranking(m, c):
+    _, r_clean_calc, worst_10 = m.ranking_sucursales(c['df_base'], c['mes_actual'])
+    return {'tabla': r_clean_calc, 'worst_10': worst_10}
+
+def _productos(m, c):
+    resumen_prod, promedio_global = m.resumen_productos(c['df'], c['mes_actual'])
+    return {'tabla': resumen_prod, 'promedio_global': promedio_global}
+
+def _bottom10(m, c):
+    # Usa el Bottom 10 de referencia para aislar esta sección del ranking
+    _, _, worst_10 = referencia.ranking_sucursales(c['df_base'], c['mes_actual'])
+    return {'tabla': m.detalle_bottom10(c['df_base'], c['mes_actual'], worst_10)}
+
+def _pareto(m, c):
+    pareto, num_80, total, pct = m.pareto_sucursales(c['df'], c['mes_actual'])
+    return {'tabla': pareto, 'num_sucursales_80': num_80, 'total_sucursales': total, 'pct_sucursales': pct}
+
+# nombre -> (cálculo, columnas llave para alinear filas, columnas que dependen del orden)
+SECCIONES = {
+    'ranking_sucursales': (_ranking, ['sucursal'], []),
+    'tendencia_global': (lambda m, c: {'tabla': m.tendencia_global(c['df_top'])}, ['cosecha_x'], []),
+    'fisico_vs_digital': (lambda m, c: {'tabla': m.fisico_vs_digital(c['df_top'])}, ['cosecha_x', 'origen'], []),
+    'comparativo_anual': (lambda m, c: {'tabla': m.comparativo_anual(c['df_base'])}, ['mes_num', 'anio'], []),
+    'historico_indicadores': (lambda m, c: {'tabla': m.historico_indicadores(c['df_base'], c['visualizar'])}, ['cosecha_x'], []),
+    'evolucion_tipo_cliente': (lambda m, c: {'tabla': m.evolucion_tipo_cliente(c['df_base'], c['visualizar'])}, ['cosecha_x', 'tipo_cliente'], []),
+    'resumen_regional': (lambda m, c: {'tabla': m.resumen_regional(c['df'], c['mes_actual'])}, ['unidad'], []),
+    'resumen_productos': (_productos, ['producto'], []),
+    'comparativa_sucursales': (lambda m, c: {'tabla': m.comparativa_sucursales(c['df'], c['mes_anterior'], c['mes_actual'])}, ['sucursal'], []),
+    'detalle_bottom10': (_bottom10, ['sucursal', 'producto'], []),
+    'heatmap_regional': (lambda m, c: {'tabla': m.heatmap_regional(c['df'], c['ultimos_6'])}, ['unidad'], []),
+    'pareto_sucursales': (_pareto, ['sucursal'], ['Acumulado', '% Acumulado', 'Rank']),
+    'sensibilidad_monto': (lambda m, c: {'tabla': m.sensibilidad_monto(c['df'], c['mes_actual'])}, ['rango_monto'], []),
+    'casos_exportar': (lambda m, c: {'tabla': m.casos_exportar(c['df'], c['cosecha_objetivo'])}, ['id_credito'], []),
+}
+
+
+# --- 3. COMPARACIÓN ---
+def _normalizar(tabla):
+    # Índices con nombre (sucursal, unidad) pasan a columna; posicionales se descartan
+    tabla = tabla.reset_index(drop=all(n is None for n in tabla.index.names))
+    tabla.columns = [str(c) for c in tabla.columns]
+    return tabla
+
+
+def _valores_iguales(a, b, tol):
+    if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+        return np.allclose(a.astype(float), b.astype(float), rtol=0, atol=tol, equal_nan=True)
+    return a.astype(str).tolist() == b.astype(str).tolist()
+
+
+def comparar_tabla(ref, alt, claves, posicionales, tol):
+    ref, alt = _normalizar(ref), _normalizar(alt)
+    if ref.empty and alt.empty:
+        return []
+    if sorted(ref.columns) != sorted(alt.columns):
+        return [f"columnas distintas: {list(ref.columns)} vs {list(alt.columns)}"]
+    if len(ref) != len(alt):
+        return [f"filas distintas: {len(ref)} vs {len(alt)}"]
+
+    errores = []
+    # Columnas que dependen del orden (acumulados, rank): se comparan por posición
+    for col in posicionales:
+        if not _valores_iguales(ref[col].reset_index(drop=True), alt[col].reset_index(drop=True), tol):
+            errores.append(f"'{col}' difiere por posición")
+
+    # El resto se alinea por llave, para no depender del orden de empates
+    claves = [c for c in claves if c in ref.columns]
+    ref = ref.sort_values(claves).reset_index(drop=True) if claves else ref.reset_index(drop=True)
+    alt = alt.sort_values(claves).reset_index(drop=True) if claves else alt.reset_index(drop=True)
+    for col in ref.columns:
+        if col in posicionales: continue
+        if not _valores_iguales(ref[col], alt[col], tol):
+            errores.append(f"'{col}' difiere")
+    return errores
+
+
+def comparar_preparados(ref, alt, tol=TOLERANCIA):
+    # Columnas derivadas fila a fila: las secciones y el drill-through dependen de la posición
+    faltantes = [c for c in COLUMNAS_PREPARADAS if c not in alt.columns]
+    if faltantes:
+        return [f"faltan columnas: {faltantes}"]
+    if len(ref) != len(alt):
+        return [f"filas distintas: {len(ref)} vs {len(alt)}"]
+    return [f"'{col}' difiere" for col in COLUMNAS_PREPARADAS
+            if not _valores_iguales(ref[col].reset_index(drop=True), alt[col].reset_index(drop=True), tol)]
+
+
+def comparar_ranking(ref_nombres, alt_nombres, tasas, tol):
+    # Los empates pueden cambiar el nombre en una posición, pero no la tasa
+    if len(ref_nombres) != len(alt_nombres):
+        return [f"largo del ranking distinto: {len(ref_nombres)} vs {len(alt_nombres)}"]
+    faltantes = [n for n in alt_nombres if n not in tasas]
+    if faltantes:
+        return [f"ranking con sucursales no elegibles: {faltantes}"]
+    for i, (a, b) in enumerate(zip(ref_nombres, alt_nombres)):
+        if abs(tasas[a] - tasas[b]) > tol:
+            return [f"ranking difiere en la posición {i + 1}: {a} vs {b}"]
+    return []
+
+
+def comparar_salidas(nombre, ref, alt, tol=TOLERANCIA):
+    _, claves, posicionales = SECCIONES[nombre]
+    errores = []
+    for parte, valor_ref in ref.items():
+        valor_alt = alt.get(parte)
+        if valor_alt is None:
+            errores.append(f"{parte}: falta en la salida")
+        elif isinstance(valor_ref, pd.DataFrame):
+            errores += [f"{parte}: {e}" for e in comparar_tabla(valor_ref, valor_alt, claves, posicionales, tol)]
+        elif parte == 'worst_10':
+            tasas = dict(zip(ref['tabla']['sucursal'], ref['tabla']['mean'])) if not ref['tabla'].empty else {}
+            errores += [f"{parte}: {e}" for e in comparar_ranking(valor_ref, valor_alt, tasas, tol)]
+        elif isinstance(valor_ref, (int, np.integer)):
+            if valor_ref != valor_alt:
+                errores.append(f"{parte}: {valor_ref} vs {valor_alt}")
+        elif not np.isclose(float(valor_ref), float(valor_alt), rtol=0, atol=tol, equal_nan=True):
+            errores.append(f"{parte}: {valor_ref} vs {valor_alt}")
+    return errores
+
+
+# --- 4. MEDICIÓN ---
+def medir(calculo, motor, ctx, repeticiones=REPETICIONES):
+    # (salida, mejor tiempo en ms, pico de memoria en MB)
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        salida = calculo(motor, ctx)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+
+    tracemalloc.start()
+    calculo(motor, ctx)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return salida, min(tiempos), pico / 1024 ** 2
+
+
+def revisar_rendimiento(nombre, motor, ms_ref, ms_alt, mb_alt, escala_presupuesto):
+    # Presupuesto absoluto de la sección y regresión relativa a la referencia
+    errores = []
+    ms_max, mb_max = PRESUPUESTOS[nombre]
+    if ms_alt > ms_max * escala_presupuesto:
+        errores.append(f"latencia {ms_alt:.0f} ms > presupuesto {ms_max * escala_presupuesto:.0f} ms")
+    if mb_alt > mb_max * escala_presupuesto:
+        errores.append(f"memoria {mb_alt:.0f} MB > presupuesto {mb_max * escala_presupuesto:.0f} MB")
+    if motor is not referencia and ms_alt > ms_ref * MAX_REGRESION and ms_alt - ms_ref > 5:
+        errores.append(f"regresión de velocidad: {ms_alt:.0f} ms vs {ms_ref:.0f} ms de referencia")
+    return errores
+
+
+def reportar(nombre, errores, ms_ref, ms_alt, mb_alt):
+    estado = 'FALLA' if errores else 'OK'
+    print(f"{nombre:<24}{estado:<8}{ms_ref:>9.1f}{ms_alt:>9.1f}{mb_alt:>9.1f}")
+    for e in errores:
+        print(f"    - {e}")
+    return bool(errores)
+
+
+def escala_por_filas(n_filas, escala_presupuesto=1.0):
+    return max(n_filas / FILAS_PRESUPUESTO, ESCALA_MINIMA) * escala_presupuesto
+
+
+def verificar(crudo, nombre_datos, motor, escala_presupuesto=1.0, golden=None, actualizar_golden=False):
+    fallas = 0
+    escala = escala_por_filas(len(crudo), escala_presupuesto)
+    encabezado = f"{'sección':<24}{'estado':<8}{'ref ms':>9}{'alt ms':>9}{'alt MB':>9}"
+
+    # Cada motor prepara su propia base a partir del archivo crudo
+    print(f"\n== {nombre_datos} · archivo crudo ({len(crudo)} filas, presupuestos × {escala:.2f}) ==")
+    print(encabezado)
+    preparar = lambda m, c: m.preparar_datos(c)
+    df_ref, ms_ref, _ = medir(preparar, referencia, crudo)
+    df_alt, ms_alt, mb_alt = medir(preparar, motor, crudo)
+    errores = comparar_preparados(df_ref, df_alt)
+    errores += revisar_rendimiento('preparar_datos', motor, ms_ref, ms_alt, mb_alt, escala)
+    fallas += reportar('preparar_datos', errores, ms_ref, ms_alt, mb_alt)
+
+    salidas_ref = {}
+    for nombre_esc, filtros in escenarios_para(df_ref).items():
+        ctx_ref = contexto(df_ref, filtros)
+        ctx_alt = contexto(df_alt, filtros, motor)
+        print(f"\n== {nombre_datos} · {nombre_esc} ({len(ctx_ref['df_base'])} créditos) ==")
+        print(encabezado)
+        for nombre, (calculo, _, _) in SECCIONES.items():
+            ref, ms_ref, _ = medir(calculo, referencia, ctx_ref)
+            salidas_ref[(nombre_esc, nombre)] = ref
+            try:
+                alt, ms_alt, mb_alt = medir(calculo, motor, ctx_alt)
+            except Exception as e:
+                # Una base preparada distinta puede romper la sección; se reporta y se sigue
+                fallas += reportar(nombre, [f"error: {e!r}"], ms_ref, float('nan'), float('nan'))
+                continue
+
+            errores = comparar_salidas(nombre, ref, alt)
+            errores += revisar_rendimiento(nombre, motor, ms_ref, ms_alt, mb_alt, escala)
+            fallas += reportar(nombre, errores, ms_ref, ms_alt, mb_alt)
+
+    # Cobertura: cada sección debe comparar datos reales en al menos un escenario
+    for nombre in SECCIONES:
+        if not any(_con_datos(salida) for (_, n), salida in salidas_ref.items() if n == nombre):
+            print(f"SIN COBERTURA {nombre}: salida vacía en todos los escenarios")
+            fallas += 1
+
+    # Salidas golden: protegen a la propia referencia contra cambios accidentales
+    if golden:
+        ruta = os.path.join(golden, f"{nombre_datos}.pkl")
+        if actualizar_golden or not os.path.exists(ruta):
+            os.makedirs(golden, exist_ok=True)
+            with open(ruta, 'wb') as f:
+                pickle.dump(salidas_ref, f)
+            print(f"Golden guardado en {ruta}")
+        else:
+            with open(ruta, 'rb') as f:
+                guardadas = pickle.load(f)
+            for (nombre_esc, nombre), esperada in guardadas.items():
+                errores = comparar_salidas(nombre, esperada, salidas_ref.get((nombre_esc, nombre), {}))
+                for e in errores:
+                    print(f"GOLDEN {nombre_esc} · {nombre}: {e}")
+                fallas += bool(errores)
+    return fallas
+
+
+def _con_datos(salida):
+    tabla = salida.get('tabla')
+    return tabla is not None and not tabla.empty
+
+
+def _mas_frecuentes(serie, n, excluir):
+    # Valores más frecuentes que no coinciden con los que el dashboard excluye
+    conteo = serie.value_counts()
+    return [v for v in conteo.index if excluir not in str(v).lower()][:n]
+
+
+def escenarios_para(df):
+    # Sin filtros (como las Pestañas 2-4) y con filtros de barra lateral (Pestaña 1).
+    # El filtrado combina valores frecuentes con los excluidos ('pr nominas', 'former')
+    # para que las exclusiones se apliquen sobre datos que deben sobrevivirlas.
+    unidades = _mas_frecuentes(df['unidad'], 2, 'pr nominas')
+    unidades += [u for u in df['unidad'].unique() if 'pr nominas' in str(u).lower()]
+    tipos = _mas_frecuentes(df['tipo_cliente'], 1, 'former')
+    tipos += [t for t in df['tipo_cliente'].unique() if 'former' in str(t).lower()]
+    return {
+        'sin filtros': {},
+        'filtrado': {'sel_uni': unidades, 'sel_tip': tipos},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalencia y rendimiento de cálculos FPD contra la referencia.")
+    parser.add_argument('--motor', help="Módulo con las funciones de calculos_fpd.py a comparar (las faltantes usan la referencia).")
+    parser.add_argument('--datos', action='append', default=[], help="Archivo xlsx/csv anonimizado (se puede repetir).")
+    parser.add_argument('--filas', type=int, default=200_000, help="Créditos del dataset sintético grande.")
+    parser.add_argument('--escala-presupuesto', type=float, default=1.0, help="Factor extra sobre los presupuestos ya escalados por filas (p. ej. máquinas lentas).")
+    parser.add_argument('--golden', help="Carpeta con salidas golden de la referencia (se crean si no existen).")
+    parser.add_argument('--actualizar-golden', action='store_true', help="Sobrescribe las salidas golden.")
+    args = parser.parse_args()
+
+    motor = referencia
+    if args.motor:
+        motor = importlib.import_module(args.motor)
+        publicas = [n for n in vars(referencia) if not n.startswith('_')]
+        propias = [n for n in publicas if callable(getattr(referencia, n)) and hasattr(motor, n)]
+        for n in publicas:
+            if not hasattr(motor, n): setattr(motor, n, getattr(referencia, n))
+        print(f"Motor '{args.motor}': {', '.join(propias) or 'sin funciones propias'}")
+
+    datasets = {
+        'sintetico_chico': generar_datos_sinteticos(n_filas=5_000, n_sucursales=80, semilla=1),
+        f'sintetico_{args.filas}': generar_datos_sinteticos(n_filas=args.filas, semilla=2),
+    }
+    for ruta in args.datos:
+        datasets[os.path.splitext(os.path.basename(ruta))[0]] = cargar_archivo(ruta)
+
+    fallas = 0
+    for nombre_datos, crudo in datasets.items():
+        fallas += verificar(crudo, nombre_datos, motor, args.escala_presupuesto, args.golden, args.actualizar_golden)
+
+    print(f"\n{'✅ Sin diferencias' if not fallas else f'❌ {fallas} secciones con fallas'}")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == '__main__':
+    main()